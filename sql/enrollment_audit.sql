@@ -0,0 +1,13 @@
+-- Table the enrollment audit flusher in student_login_15.py writes to.
+-- Run once per database; the app's MySQL user only needs INSERT on it.
+CREATE TABLE IF NOT EXISTS enrollment_audit (
+    event_id CHAR(32) PRIMARY KEY,
+    batch_id CHAR(32) NULL,
+    action VARCHAR(16) NOT NULL,
+    outcome VARCHAR(16) NOT NULL,
+    student_id VARCHAR(32) NOT NULL,
+    course_id VARCHAR(32) NOT NULL,
+    semester INT NULL,
+    year INT NULL,
+    occurred_at DATETIME(6) NOT NULL
+);
@@ -1,18 +1,22 @@
 import streamlit as st
-import mysql.connector
-from mysql.connector import Error
-import requests
-import pandas as pd
 from datetime import datetime
 import time
-from streamlit_option_menu import option_menu
-import bcrypt
-import base64
 import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+# pandas, mysql.connector, requests, bcrypt and streamlit_option_menu are
+# imported inside the functions that use them, so a new server process only
+# pays for them when a page actually needs them (see tools/importtime_report.py)
 
 # ========================================
 # Function to create a database connection
 def create_connection():
+    import mysql.connector
+    from mysql.connector import Error
     config = {
         'user': st.secrets["mysql"]["user"],
         'password': st.secrets["mysql"]["password"],
@@ -33,81 +37,277 @@ def close_connection(conn):
         conn.close()
 
 
+# ========================================
+# Query result cache
+# Read-through cache for SELECTs, shared by every session of this server
+# process. Entries are keyed by the whitespace-normalised SQL plus its params,
+# tagged with the tables the query reads, evicted LRU once the cache passes
+# QUERY_CACHE_MAX_BYTES, and dropped when a mutator calls
+# invalidate_tables() for one of their tables. The TTL bounds staleness from
+# writes made outside this app. Hit/miss statistics go to the server log every
+# QUERY_CACHE_STATS_INTERVAL_SECONDS while the cache is in use.
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+QUERY_CACHE_TTL_SECONDS = 300
+QUERY_CACHE_STATS_INTERVAL_SECONDS = 300
+QUERY_TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+
+@st.cache_resource
+def get_query_cache():
+    cache = {
+        "lock": threading.Lock(),
+        "entries": OrderedDict(),  # key -> (DataFrame, tables, size, expires_at)
+        "tags": {},                # table -> set of keys
+        "versions": {},            # table -> number of invalidations so far
+        "bytes": 0,
+        "stats": {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0},
+    }
+    thread = threading.Thread(target=run_query_cache_stats_logger, args=(cache,), name="query-cache-stats", daemon=True)
+    thread.start()
+    return cache
+
+def normalize_sql(query):
+    return " ".join(query.split())
+
+def query_tables(query):
+    return frozenset(table.lower() for table in QUERY_TABLE_PATTERN.findall(query))
+
+def cached_read_sql(query, params=()):
+    import pandas as pd
+    sql = normalize_sql(query)
+    key = (sql, tuple(params))
+    tables = query_tables(sql)
+    cache = get_query_cache()
+    with cache["lock"]:
+        entry = cache["entries"].get(key)
+        if entry and entry[3] > time.monotonic():
+            cache["entries"].move_to_end(key)
+            cache["stats"]["hits"] += 1
+            # Callers add columns to what they get back, so hand out a copy
+            return entry[0].copy()
+        if entry:
+            remove_cache_entry(cache, key)
+        cache["stats"]["misses"] += 1
+        versions = {table: cache["versions"].get(table, 0) for table in tables}
+
+    conn = create_connection()
+    if not conn:
+        # None, not an empty frame, so callers can tell "unreachable" from "no rows"
+        return None
+    try:
+        df = pd.read_sql(query, conn, params=params)
+    finally:
+        close_connection(conn)
+
+    size = estimate_size(df)
+    with cache["lock"]:
+        # Skip storing if a write to one of the tables landed while reading
+        if size <= QUERY_CACHE_MAX_BYTES and all(
+            cache["versions"].get(table, 0) == version for table, version in versions.items()
+        ):
+            if key in cache["entries"]:
+                remove_cache_entry(cache, key)
+            cache["entries"][key] = (df, tables, size, time.monotonic() + QUERY_CACHE_TTL_SECONDS)
+            cache["bytes"] += size
+            for table in tables:
+                cache["tags"].setdefault(table, set()).add(key)
+            while cache["bytes"] > QUERY_CACHE_MAX_BYTES:
+                remove_cache_entry(cache, next(iter(cache["entries"])))
+                cache["stats"]["evictions"] += 1
+    return df.copy()
+
+def remove_cache_entry(cache, key):
+    df, tables, size, expires_at = cache["entries"].pop(key)
+    cache["bytes"] -= size
+    for table in tables:
+        keys = cache["tags"].get(table)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del cache["tags"][table]
+
+def invalidate_tables(*tables):
+    cache = get_query_cache()
+    with cache["lock"]:
+        for table in tables:
+            table = table.lower()
+            cache["versions"][table] = cache["versions"].get(table, 0) + 1
+            for key in list(cache["tags"].get(table, ())):
+                remove_cache_entry(cache, key)
+                cache["stats"]["invalidations"] += 1
+
+def query_cache_stats(cache=None):
+    cache = cache or get_query_cache()
+    with cache["lock"]:
+        stats = dict(cache["stats"])
+        stats["entries"] = len(cache["entries"])
+        stats["bytes"] = cache["bytes"]
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+def run_query_cache_stats_logger(cache):
+    last_lookups = 0
+    while True:
+        time.sleep(QUERY_CACHE_STATS_INTERVAL_SECONDS)
+        stats = query_cache_stats(cache)
+        lookups = stats["hits"] + stats["misses"]
+        # Stay quiet while nobody is using the app
+        if lookups == last_lookups:
+            continue
+        last_lookups = lookups
+        print(
+            f"Query cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+            f"{stats['evictions']} evictions, {stats['invalidations']} invalidations, "
+            f"{stats['entries']} entries, {stats['bytes'] / (1024 * 1024):.1f} MiB"
+        )
+
+def estimate_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# ========================================
+# Shared course catalog
+# One compact, read-only copy of the course table per server process:
+# categorical names, float credits, interned course ids and a course_id ->
+# row index. Pages work on CourseViews, which pair the catalog with a
+# read-only array of row numbers instead of holding a DataFrame per session.
+# tools/catalog_memory_bench.py measures the per-session footprint.
+CATALOG_QUERY = """
+    SELECT
+        c.course_id,
+        c.course_name,
+        c.credits,
+        i.first_name AS instructor_first_name,
+        i.last_name AS instructor_last_name,
+        EXISTS (SELECT 1 FROM old_course o WHERE o.course_id = c.course_id) AS is_old
+    FROM course c
+    LEFT JOIN instructor i ON c.instructor_id = i.instructor_id
+    ORDER BY c.course_id
+"""
+
+CourseView = namedtuple("CourseView", ["catalog", "positions"])
+
+def build_course_catalog(courses_df):
+    import numpy as np
+    import pandas as pd
+    courses_df = courses_df.drop_duplicates("course_id")
+    course_ids = [sys.intern(str(course_id)) for course_id in courses_df["course_id"]]
+    # float keeps fractional credits, and NULL credits stay missing (NaN)
+    credits = pd.to_numeric(courses_df["credits"], errors="coerce").to_numpy(dtype=np.float64)
+    first_names = courses_df["instructor_first_name"].fillna("")
+    last_names = courses_df["instructor_last_name"].fillna("")
+    options = [
+        f"{course_id}: {course_name} ({course_credits} credits) - Instructor: {first_name} {last_name}"
+        for course_id, course_name, course_credits, first_name, last_name
+        in zip(course_ids, courses_df["course_name"], courses_df["credits"], first_names, last_names)
+    ]
+    catalog = {
+        "course_id": np.array(course_ids, dtype=object),
+        "course_name": pd.Categorical(courses_df["course_name"]),
+        "credits": credits,
+        "instructor_first_name": pd.Categorical(first_names),
+        "instructor_last_name": pd.Categorical(last_names),
+        "current": ~courses_df["is_old"].fillna(0).to_numpy(dtype=bool),
+        "option": np.array(options, dtype=object),
+        "index": {course_id: row for row, course_id in enumerate(course_ids)},
+    }
+    for column in ("course_id", "credits", "current", "option"):
+        catalog[column].setflags(write=False)
+    return catalog
+
+@st.cache_resource(ttl=QUERY_CACHE_TTL_SECONDS)
+def load_course_catalog():
+    # Reads MySQL directly: going through cached_read_sql would stack its TTL
+    # on top of this one, and a course change could take twice as long to show
+    import pandas as pd
+    conn = create_connection()
+    if not conn:
+        # Raising keeps the failure out of st.cache_resource
+        raise LookupError("Course catalog is unavailable.")
+    try:
+        catalog_df = pd.read_sql(CATALOG_QUERY, conn)
+    finally:
+        close_connection(conn)
+    return build_course_catalog(catalog_df)
+
+def get_course_catalog():
+    # None, like cached_read_sql, when the database is unreachable
+    try:
+        return load_course_catalog()
+    except LookupError:
+        return None
+
+def course_view(catalog, mask):
+    import numpy as np
+    positions = np.flatnonzero(mask).astype(np.int32)
+    positions.setflags(write=False)
+    return CourseView(catalog, positions)
+
+def catalog_rows(catalog, course_ids):
+    import numpy as np
+    mask = np.zeros(len(catalog["course_id"]), dtype=bool)
+    rows = [catalog["index"][course_id] for course_id in course_ids if course_id in catalog["index"]]
+    mask[rows] = True
+    return mask
+
+# Function to get a student's enrollment rows, newest first
+def get_student_enrollments(student_id):
+    query = """
+        SELECT e.course_id, e.semester, e.year, e.grade
+        FROM enrollment e
+        WHERE e.student_id = %s
+        ORDER BY e.year DESC, e.semester DESC
+    """
+    enrollments = cached_read_sql(query, (student_id,))
+    if enrollments is None:
+        return None
+    enrollments["course_id"] = enrollments["course_id"].astype(str)
+    return enrollments
+
 
 #if __name__ == "__main__":
 # ========================================
 # Function to get courses not yet enrolled
 def get_unenrolled_courses(student_id):
-    conn = create_connection()
-    if conn:
-        try:
-            query = """
-                SELECT 
-                    c.course_id, 
-                    c.course_name, 
-                    c.credits,
-                    i.first_name AS instructor_first_name,
-                    i.last_name AS instructor_last_name
-                FROM course c
-                LEFT JOIN instructor i ON c.instructor_id = i.instructor_id
-                WHERE c.course_id NOT IN (
-                    SELECT e.course_id
-                    FROM enrollment e
-                    WHERE e.student_id = %s
-                )
-                AND c.course_id NOT IN (
-                    SELECT course_id FROM old_course
-                )
-            """
-            df = pd.read_sql(query, conn, params=(student_id,))
-            return df
-        except Error as e:
-            st.error(f"Error fetching unenrolled courses: {e}")
-            return pd.DataFrame()
-        finally:
-            close_connection(conn)
-    else:
-        return pd.DataFrame()
+    from mysql.connector import Error
+    try:
+        catalog = get_course_catalog()
+        enrollments = get_student_enrollments(student_id) if catalog is not None else None
+        if enrollments is None:
+            st.error("Unable to connect to the database.")
+            return None
+        enrolled = catalog_rows(catalog, enrollments["course_id"])
+        return course_view(catalog, catalog["current"] & ~enrolled)
+    except Error as e:
+        st.error(f"Error fetching unenrolled courses: {e}")
+        return None
 
 
 
 # Function to get courses already enrolled
 def get_enrolled_courses(student_id):
-    conn = create_connection()
-    if conn:
-        try:
-            query = """
-                SELECT 
-                    c.course_id, 
-                    c.course_name, 
-                    c.credits,
-                    i.first_name AS instructor_first_name,
-                    i.last_name AS instructor_last_name
-                FROM course c
-                INNER JOIN enrollment e ON c.course_id = e.course_id
-                LEFT JOIN instructor i ON c.instructor_id = i.instructor_id
-                WHERE e.student_id = %s
-                AND c.course_id NOT IN (
-                    SELECT course_id FROM old_course
-                )
-            """
-            df = pd.read_sql(query, conn, params=(student_id,))
-            return df
-        except Error as e:
-            st.error(f"Error fetching enrolled courses: {e}")
-            return pd.DataFrame()
-        finally:
-            close_connection(conn)
-    else:
-        return pd.DataFrame()
+    from mysql.connector import Error
+    try:
+        catalog = get_course_catalog()
+        enrollments = get_student_enrollments(student_id) if catalog is not None else None
+        if enrollments is None:
+            st.error("Unable to connect to the database.")
+            return None
+        enrolled = catalog_rows(catalog, enrollments["course_id"])
+        return course_view(catalog, catalog["current"] & enrolled)
+    except Error as e:
+        st.error(f"Error fetching enrolled courses: {e}")
+        return None
 
 
 
 # ========================================
 # Function to add courses to enrollment
 def add_courses_to_enrollment(student_id, course_ids, semester=1, year=datetime.now().year):
+    from mysql.connector import Error
     conn = create_connection()
     if conn:
+        audit_batch = audit_enrollment("add", student_id, course_ids, "intent", semester=semester, year=year)
         try:
             cursor = conn.cursor()
             enrollment_date = datetime.now().strftime('%Y-%m-%d')
@@ -118,16 +318,21 @@ def add_courses_to_enrollment(student_id, course_ids, semester=1, year=datetime.
                 """
                 cursor.execute(query, (student_id, course_id, semester, year, enrollment_date))
             conn.commit()
+            audit_enrollment("add", student_id, course_ids, "committed", audit_batch, semester, year)
+            invalidate_tables("enrollment")
 
         except Error as e:
+            audit_enrollment("add", student_id, course_ids, "failed", audit_batch, semester, year)
             st.error(f"Error adding courses: {e}")
         finally:
             close_connection(conn)
 
 # Function to drop courses from enrollment
 def drop_courses_from_enrollment(student_id, course_ids):
+    from mysql.connector import Error
     conn = create_connection()
     if conn:
+        audit_batch = audit_enrollment("drop", student_id, course_ids, "intent")
         try:
             cursor = conn.cursor()
             for course_id in course_ids:
@@ -137,8 +342,11 @@ def drop_courses_from_enrollment(student_id, course_ids):
                 """
                 cursor.execute(query, (student_id, course_id))
             conn.commit()
+            audit_enrollment("drop", student_id, course_ids, "committed", audit_batch)
+            invalidate_tables("enrollment")
 
         except Error as e:
+            audit_enrollment("drop", student_id, course_ids, "failed", audit_batch)
             st.error(f"Error dropping courses: {e}")
         finally:
             close_connection(conn)
@@ -150,34 +358,23 @@ def drop_courses_from_enrollment(student_id, course_ids):
 # ========================================
 # Function to display course selection page
 def course_selection_page(
-    title, instruction, courses_df, action_button_text, confirm_action, back_action):
+    title, instruction, courses, action_button_text, confirm_action, back_action):
     st.title(title)
     st.write(instruction)
 
-    if not courses_df.empty:
-        # Fill NaN values in instructor names with empty strings
-        courses_df['instructor_first_name'] = courses_df['instructor_first_name'].fillna('')
-        courses_df['instructor_last_name'] = courses_df['instructor_last_name'].fillna('')
-
-        # Create a new 'option' column
-        courses_df['option'] = courses_df.apply(
-            lambda row: f"{row['course_id']}: {row['course_name']} ({row['credits']} credits) - Instructor: {row['instructor_first_name']} {row['instructor_last_name']}",
-            axis=1
-        )
-
-        # Map 'option' to 'course_id'
-        option_to_course_id = dict(zip(courses_df['option'], courses_df['course_id']))
+    if courses is not None and len(courses.positions) > 0:
+        catalog = courses.catalog
 
-        # Display options in the multiselect widget
-        selected_options = st.multiselect(
+        # Options are the interned course IDs, which stay stable when the
+        # catalog is reloaded; labels come from the shared catalog
+        selected_course_ids = st.multiselect(
             "Please select courses",
-            options=courses_df['option'].tolist()
+            options=catalog["course_id"][courses.positions].tolist(),
+            format_func=lambda course_id: catalog["option"][catalog["index"][course_id]]
         )
 
         if st.button(action_button_text):
-            if selected_options:
-                # Map selected options back to course IDs
-                selected_course_ids = [option_to_course_id[option] for option in selected_options]
+            if selected_course_ids:
                 st.session_state['selected_courses'] = selected_course_ids
                 st.session_state['confirmation_step'] = True
             else:
@@ -185,14 +382,15 @@ def course_selection_page(
         if st.session_state.get('confirmation_step', False):
             st.write("**Confirm your selection**")
             for course_id in st.session_state['selected_courses']:
-                course_info = courses_df[courses_df['course_id'] == course_id].iloc[0]
-                st.write(f"- {course_info['course_id']}: {course_info['course_name']} ({course_info['credits']} credits) - Instructor: {course_info['instructor_first_name']} {course_info['instructor_last_name']}")
+                row = catalog["index"].get(course_id)
+                if row is not None:
+                    st.write(f"- {catalog['option'][row]}")
             col1, col2 = st.columns(2)
             with col1:
                 st.button("Confirm", on_click=confirm_action)
             with col2:
                 st.button("Cancel", on_click=handle_cancel)
-    else:
+    elif courses is not None:
         st.info("No courses available.")
     st.button("Back", on_click=back_action)
 
@@ -211,7 +409,7 @@ def add_course_page():
         course_selection_page(
             title="Add Course",
             instruction="Select courses you want to add:",
-            courses_df=unenrolled_courses,
+            courses=unenrolled_courses,
             action_button_text="Add Course",
             confirm_action=handle_confirm_add_course,
             back_action=go_to_main_menu
@@ -240,7 +438,7 @@ def drop_course_page():
         course_selection_page(
             title="Drop Course",
             instruction="Select courses you want to drop:",
-            courses_df=enrolled_courses,
+            courses=enrolled_courses,
             action_button_text="Drop Course",
             confirm_action=handle_confirm_drop_course,
             back_action=go_to_main_menu
@@ -270,7 +468,7 @@ def withdraw_course_page():
         course_selection_page(
             title="Withdraw Course",
             instruction="Select courses you want to withdraw:",
-            courses_df=enrolled_courses,
+            courses=enrolled_courses,
             action_button_text="Withdraw Course",
             confirm_action=handle_confirm_withdraw_course,
             back_action=go_to_main_menu
@@ -291,8 +489,10 @@ def handle_confirm_withdraw_course():
         st.error("Student ID not found.")
 
 def withdraw_courses(student_id, course_ids):
+    from mysql.connector import Error
     conn = create_connection()
     if conn:
+        audit_batch = audit_enrollment("withdraw", student_id, course_ids, "intent")
         try:
             cursor = conn.cursor()
             for course_id in course_ids:
@@ -303,7 +503,10 @@ def withdraw_courses(student_id, course_ids):
                 """
                 cursor.execute(query, (student_id, course_id))
             conn.commit()
+            audit_enrollment("withdraw", student_id, course_ids, "committed", audit_batch)
+            invalidate_tables("enrollment")
         except Error as e:
+            audit_enrollment("withdraw", student_id, course_ids, "failed", audit_batch)
             st.error(f"Error withdrawing courses: {e}")
         finally:
             close_connection(conn)
@@ -311,34 +514,19 @@ def withdraw_courses(student_id, course_ids):
         st.error("Unable to connect to the database.")
 
 def get_enrolled_courses_for_withdraw(student_id):
-    conn = create_connection()
-    if conn:
-        try:
-            query = """
-                SELECT 
-                    c.course_id, 
-                    c.course_name, 
-                    c.credits,
-                    i.first_name AS instructor_first_name,
-                    i.last_name AS instructor_last_name
-                FROM course c
-                INNER JOIN enrollment e ON c.course_id = e.course_id
-                LEFT JOIN instructor i ON c.instructor_id = i.instructor_id
-                WHERE e.student_id = %s
-                AND c.course_id NOT IN (
-                    SELECT course_id FROM old_course
-                )
-                AND (e.grade IS NULL OR e.grade != 'W')
-            """
-            df = pd.read_sql(query, conn, params=(student_id,))
-            return df
-        except Error as e:
-            st.error(f"Error fetching courses for withdrawal: {e}")
-            return pd.DataFrame()
-        finally:
-            close_connection(conn)
-    else:
-        return pd.DataFrame()
+    from mysql.connector import Error
+    try:
+        catalog = get_course_catalog()
+        enrollments = get_student_enrollments(student_id) if catalog is not None else None
+        if enrollments is None:
+            st.error("Unable to connect to the database.")
+            return None
+        not_withdrawn = enrollments[enrollments["grade"].isna() | (enrollments["grade"] != 'W')]
+        enrolled = catalog_rows(catalog, not_withdrawn["course_id"])
+        return course_view(catalog, catalog["current"] & enrolled)
+    except Error as e:
+        st.error(f"Error fetching courses for withdrawal: {e}")
+        return None
 
 
 
@@ -349,71 +537,82 @@ def go_to_main_menu():
 
 # ========================================
 # Registration Status Page
+# Function to get the student record and enrollment history shown on the Registration Status page
+def get_registration_status_data(student_id):
+    from mysql.connector import Error
+    import pandas as pd
+    try:
+        # ดึงข้อมูลนักศึกษา
+        student_query = '''
+            SELECT student_id, first_name, last_name, faculty_name
+            FROM student
+            WHERE student_id = %s
+        '''
+        student_data = cached_read_sql(student_query, (student_id,))
+
+        # ปรับปรุงคำสั่ง SQL เพื่อดึง semester และ year
+        catalog = get_course_catalog() if student_data is not None else None
+        enrollments = get_student_enrollments(student_id) if catalog is not None else None
+        if enrollments is None:
+            st.error("Unable to connect to the database.")
+            return None
+        rows = enrollments["course_id"].map(catalog["index"])
+        enrollments = enrollments[rows.notna()]
+        rows = rows.dropna().to_numpy(dtype=int)
+        enrollment_data = pd.DataFrame({
+            "course_id": catalog["course_id"][rows],
+            "course_name": catalog["course_name"].take(rows),
+            "credits": catalog["credits"][rows],
+            "semester": enrollments["semester"].to_numpy(),
+            "year": enrollments["year"].to_numpy(),
+            "grade": enrollments["grade"].to_numpy(),
+        })
+        return student_data, enrollment_data
+    except Error as e:
+        st.error(f"Error fetching data: {e}")
+        return None
+
 def registration_status_page():
     st.title("Registration Status")
 
     student_id = st.session_state.get("username", None)
     if student_id:
-        conn = create_connection()
-        if conn:
-            try:
-                # ดึงข้อมูลนักศึกษา
-                student_query = '''
-                    SELECT student_id, first_name, last_name, faculty_name
-                    FROM student
-                    WHERE student_id = %s
-                '''
-                student_data = pd.read_sql(student_query, conn, params=(student_id,))
-
-                if not student_data.empty:
-                    col1, col2 = st.columns([1, 3])
-                    with col1:
-                        profile_image_bytes = get_profile_image(student_id)
-                        display_image_with_frame(profile_image_bytes, width=150)
-                    with col2:
-                        st.write(f"**Student ID:** {student_data['student_id'].iloc[0]}")
-                        st.write(f"**Name:** {student_data['first_name'].iloc[0]} {student_data['last_name'].iloc[0]}")
-                        st.write(f"**Faculty:** {student_data['faculty_name'].iloc[0]}")
-
-                    # ปรับปรุงคำสั่ง SQL เพื่อดึง semester และ year
-                    enrollment_query = '''
-                        SELECT c.course_id, c.course_name, c.credits, e.semester, e.year, e.grade
-                        FROM enrollment e
-                        INNER JOIN course c ON e.course_id = c.course_id
-                        WHERE e.student_id = %s
-                        ORDER BY e.year DESC, e.semester DESC
-                    '''
-                    enrollment_data = pd.read_sql(enrollment_query, conn, params=(student_id,))
-
-                    if not enrollment_data.empty:
-                        st.write("### Enrolled Courses")
-                        styled_enrollment_data = enrollment_data.style.set_properties(**{'text-align': 'left'})
-                        enrollment_data['course_id'] = enrollment_data['course_id'].astype(str)
-                        enrollment_data['year'] = enrollment_data['year'].astype(str)
-                        st.dataframe(styled_enrollment_data)
-
-                        # การคำนวณ GPAX
-                        grade_to_gpa = {'A': 4.0, 'B+': 3.5, 'B': 3.0, 'C+': 2.5, 'C': 2.0, 'D+': 1.5, 'D': 1.0, 'F': 0.0}
-                        valid_courses = enrollment_data[
-                            enrollment_data['grade'].isin(grade_to_gpa.keys())
-                        ]
-                        valid_courses['gpa'] = valid_courses['grade'].map(grade_to_gpa)
-                        valid_courses['weighted_gpa'] = valid_courses['gpa'] * valid_courses['credits']
-                        total_credits = valid_courses['credits'].sum()
-                        total_weighted_gpa = valid_courses['weighted_gpa'].sum()
-
-                        gpax = total_weighted_gpa / total_credits if total_credits > 0 else 0.0
-                        st.metric("GPAX", f"{gpax:.2f}")
-                    else:
-                        st.info("No courses enrolled yet.")
+        status_data = get_registration_status_data(student_id)
+        if status_data is not None:
+            student_data, enrollment_data = status_data
+            if not student_data.empty:
+                col1, col2 = st.columns([1, 3])
+                with col1:
+                    profile_image_url = get_profile_image_url(student_id)
+                    display_image_with_frame(profile_image_url, width=150)
+                with col2:
+                    st.write(f"**Student ID:** {student_data['student_id'].iloc[0]}")
+                    st.write(f"**Name:** {student_data['first_name'].iloc[0]} {student_data['last_name'].iloc[0]}")
+                    st.write(f"**Faculty:** {student_data['faculty_name'].iloc[0]}")
+
+                if not enrollment_data.empty:
+                    st.write("### Enrolled Courses")
+                    styled_enrollment_data = enrollment_data.style.set_properties(**{'text-align': 'left'})
+                    enrollment_data['course_id'] = enrollment_data['course_id'].astype(str)
+                    enrollment_data['year'] = enrollment_data['year'].astype(str)
+                    st.dataframe(styled_enrollment_data)
+
+                    # การคำนวณ GPAX
+                    grade_to_gpa = {'A': 4.0, 'B+': 3.5, 'B': 3.0, 'C+': 2.5, 'C': 2.0, 'D+': 1.5, 'D': 1.0, 'F': 0.0}
+                    valid_courses = enrollment_data[
+                        enrollment_data['grade'].isin(grade_to_gpa.keys())
+                    ]
+                    valid_courses['gpa'] = valid_courses['grade'].map(grade_to_gpa)
+                    valid_courses['weighted_gpa'] = valid_courses['gpa'] * valid_courses['credits']
+                    total_credits = valid_courses['credits'].sum()
+                    total_weighted_gpa = valid_courses['weighted_gpa'].sum()
+
+                    gpax = total_weighted_gpa / total_credits if total_credits > 0 else 0.0
+                    st.metric("GPAX", f"{gpax:.2f}")
                 else:
-                    st.error("Student information not found.")
-            except Error as e:
-                st.error(f"Error fetching data: {e}")
-            finally:
-                close_connection(conn)
-        else:
-            st.error("Unable to connect to the database.")
+                    st.info("No courses enrolled yet.")
+            else:
+                st.error("Student information not found.")
     else:
         st.error("Student ID not found.")
     if st.button("Back"):
@@ -426,82 +625,27 @@ def registration_status_page():
 # Main menu page
 # Student Registration System Page
 def student_registration_system_page():
-    st.markdown("""
-            <style>
-            .custom-title {
-                background-color: #1a458a;
-                padding: 20px;
-                border-radius: 10px;
-                text-align: center;
-                box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                margin-bottom: 25px;
-            }
-            .custom-title h1 {
-                color: white;
-                font-size: 36px;
-                margin: 0;
-            }
-            .custom-title:hover {
-            background-color: #0056b3;
-            transition: background-color 0.3s ease;
-            }
-            </style>
-            <div class="custom-title">
-                <h1>Student Registration System</h1>
-            </div>
-        """, unsafe_allow_html=True)
+    use_css("main_menu.css")
+    st.markdown(TITLE_HTML, unsafe_allow_html=True)
 
     student_id = st.session_state.get("username", None)
     student_name = get_student_name(student_id)
-    st.markdown("""
-            <style>
-            .stButton > button {
-                width: 100%;
-                height: 60px;
-                font-size: 20px;
-                margin-bottom: 10px;
-            }
-            </style>
-        """, unsafe_allow_html=True)
-
     if student_id:
-        #profile_image = get_profile_image(student_id)
+        #profile_image = get_profile_image_url(student_id)
         col1, col2, col3 = st.columns([2,2, 1])
         with col1:
-            st.markdown("""
-                        <style>
-                        /* ปรับตัวเลือก CSS ให้ตรงกับโครงสร้าง DOM ใหม่ */
-                        .stButton > div > button {
-                            width: 100%;
-                            height: 60px;
-                            font-size: 20px;
-                            margin-bottom: 10px;
-                        }
-                        </style>
-                    """, unsafe_allow_html=True)
             st.write(f"Welcome, **{student_name}**!")
             st.button("Add Course", help="Add new courses to your enrollment", on_click=go_to_add_course)
             st.button("Withdraw Course", help="Withdraw courses form enrolled courses", on_click=go_to_withdraw_course)
         with col2:
-            st.markdown("""
-                        <style>
-                        /* ปรับตัวเลือก CSS ให้ตรงกับโครงสร้าง DOM ใหม่ */
-                        .stButton > div > button {
-                            width: 100%;
-                            height: 60px;
-                            font-size: 20px;
-                            margin-bottom: 10px;
-                        }
-                        </style>
-                    """, unsafe_allow_html=True)
             st.write("")
             st.write("")
             st.button("Drop Course", help="Drop courses to your enrollment", on_click=go_to_drop_course)
             st.button("Registration Status", help="View your current registration status", on_click=go_to_registration_status)
 
         with col3:
-            profile_image_bytes = get_profile_image(student_id)
-            display_image_with_frame(profile_image_bytes, width=300)
+            profile_image_url = get_profile_image_url(student_id)
+            display_image_with_frame(profile_image_url, width=300)
             if st.button("My Profile", help="View your profile"):
                 st.session_state["current_page"] = "My Profile"
                 st.rerun()
@@ -510,57 +654,41 @@ def student_registration_system_page():
 
 
 def my_profile_page():
+    from mysql.connector import Error
     st.title("My Profile")
     student_id = st.session_state.get("username", None)
     if student_id:
-        conn = create_connection()
-        if conn:
-            try:
-                # ดึงข้อมูลจากตาราง student
-                student_query = """
-                    SELECT s.student_id, s.first_name, s.last_name, s.faculty_name, s.contact_number, s.register_date
-                    FROM student s
-                    WHERE s.student_id = %s
-                """
-                student_data = pd.read_sql(student_query, conn, params=(student_id,))
-
-                # ดึงรหัสผ่านจากตาราง student_login
-                password_query = """
-                    SELECT password
-                    FROM student_login
-                    WHERE student_id = %s
-                """
-                cursor = conn.cursor()
-                cursor.execute(password_query, (student_id,))
-                password_result = cursor.fetchone()
-                password = password_result[0] if password_result else "N/A"
-
-                if not student_data.empty:
-                    col1, col2 = st.columns([1,3])
-                    with col1:
-                        profile_image_bytes = get_profile_image(student_id)
-                        display_image_with_frame(profile_image_bytes, width=550)
-
-                    with col2:
-                        st.write(f"**Student ID:** {student_data['student_id'].iloc[0]}")
-                        st.write(f"**Name:** {student_data['first_name'].iloc[0]} {student_data['last_name'].iloc[0]}")
-                        st.write(f"**Faculty:** {student_data['faculty_name'].iloc[0]}")
-                        st.write(f"**Contact Number:** {student_data['contact_number'].iloc[0]}")
-                        st.write(f"**Register Date:** {student_data['register_date'].iloc[0]}")
-
-                    #st.write(f"**Password:** {password}")
-
-                    if st.button("Change Password",):
-                        st.session_state['current_page'] = "Change Password"
-                        st.rerun()
-                else:
-                    st.error("Student information not found.")
-            except Error as e:
-                st.error(f"Error fetching data: {e}")
-            finally:
-                close_connection(conn)
-        else:
-            st.error("Unable to connect to the database.")
+        try:
+            # ดึงข้อมูลจากตาราง student
+            student_query = """
+                SELECT s.student_id, s.first_name, s.last_name, s.faculty_name, s.contact_number, s.register_date
+                FROM student s
+                WHERE s.student_id = %s
+            """
+            student_data = cached_read_sql(student_query, (student_id,))
+
+            if student_data is None:
+                st.error("Unable to connect to the database.")
+            elif not student_data.empty:
+                col1, col2 = st.columns([1,3])
+                with col1:
+                    profile_image_url = get_profile_image_url(student_id)
+                    display_image_with_frame(profile_image_url, width=550)
+
+                with col2:
+                    st.write(f"**Student ID:** {student_data['student_id'].iloc[0]}")
+                    st.write(f"**Name:** {student_data['first_name'].iloc[0]} {student_data['last_name'].iloc[0]}")
+                    st.write(f"**Faculty:** {student_data['faculty_name'].iloc[0]}")
+                    st.write(f"**Contact Number:** {student_data['contact_number'].iloc[0]}")
+                    st.write(f"**Register Date:** {student_data['register_date'].iloc[0]}")
+
+                if st.button("Change Password",):
+                    st.session_state['current_page'] = "Change Password"
+                    st.rerun()
+            else:
+                st.error("Student information not found.")
+        except Error as e:
+            st.error(f"Error fetching data: {e}")
     else:
         st.error("Student ID not found.")
     if st.button("Back"):
@@ -570,6 +698,8 @@ def my_profile_page():
 
 
 def change_password_page():
+    from mysql.connector import Error
+    import bcrypt
     st.title("Change Password")
     student_id = st.session_state.get("username", None)
     if student_id:
@@ -602,15 +732,16 @@ def change_password_page():
                                     st.error("New password cannot be the same as the current password.")
                                 else:
                                     # Hash the new password
-                                    hashed_new_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+                                    hashed_new_password = hash_password(new_password)
                                     # Update the password in the database
                                     update_query = """
                                         UPDATE student_login
                                         SET password = %s
                                         WHERE student_id = %s
                                     """
-                                    cursor.execute(update_query, (hashed_new_password.decode('utf-8'), student_id))
+                                    cursor.execute(update_query, (hashed_new_password, student_id))
                                     conn.commit()
+                                    invalidate_tables("student_login")
                                     st.success("Password changed successfully.")
                                     st.session_state['current_page'] = "My Profile"
                                     st.rerun()
@@ -667,6 +798,16 @@ def login_page():
         try_login(input_username, input_password)
 
 def try_login(input_username, input_password):
+    from mysql.connector import Error
+    throttle_keys = get_throttle_keys(input_username)
+    if not login_allowed(throttle_keys):
+        st.error("Too many failed login attempts. Please wait a minute and try again.")
+        return
+    if is_unknown_student_id(input_username):
+        record_login_failure(throttle_keys)
+        st.error("Student ID not found.")
+        return
+    import bcrypt
     conn = create_connection()
     if conn:
         try:
@@ -683,17 +824,23 @@ def try_login(input_username, input_password):
                 try:
                     # Check if stored password is a valid bcrypt hash
                     if bcrypt.checkpw(input_password.encode('utf-8'), stored_password.encode('utf-8')):
+                        rehash_password_if_needed(conn, input_username, input_password, stored_password)
+                        record_login_success(input_username)
                         st.session_state['logged_in'] = True
                         st.session_state['username'] = input_username
                         st.session_state['current_page'] = "Student Registration System"
+                        start_warmup(input_username)
                         st.success("Login successful.")
                         st.rerun()
                     else:
+                        record_login_failure(throttle_keys)
                         st.error("Incorrect password.")
                 except ValueError as ve:
                     st.error("An error occurred during password verification. Please contact support.")
                     print(f"ValueError: {ve}")
             else:
+                remember_unknown_student_id(input_username)
+                record_login_failure(throttle_keys)
                 st.error("Student ID not found.")
         except Error as e:
             st.error(f"Error during authentication: {e}")
@@ -705,76 +852,547 @@ def try_login(input_username, input_password):
 
 
 # ========================================
-# Function to get profile image
-def get_profile_image(student_id):
+# bcrypt cost
+# The target cost comes from [login] bcrypt_rounds in secrets.toml; pick it
+# with tools/calibrate_bcrypt.py. Hashes with another cost are rehashed the
+# next time their owner logs in. ([auth] is left alone: Streamlit reserves it
+# for st.login and turns on XSRF protection whenever it exists.)
+DEFAULT_BCRYPT_ROUNDS = 12
+MIN_BCRYPT_ROUNDS = 10  # security floor, even on hosts too slow to meet the latency target
+MAX_BCRYPT_ROUNDS = 31  # the most bcrypt.gensalt accepts
+
+def get_bcrypt_rounds():
+    try:
+        rounds = int(st.secrets["login"]["bcrypt_rounds"])
+    except (KeyError, FileNotFoundError):
+        return DEFAULT_BCRYPT_ROUNDS
+    except (TypeError, ValueError):
+        print(f"Ignoring invalid [login] bcrypt_rounds, using {DEFAULT_BCRYPT_ROUNDS}")
+        return DEFAULT_BCRYPT_ROUNDS
+    if rounds < MIN_BCRYPT_ROUNDS:
+        print(f"[login] bcrypt_rounds = {rounds} is below the minimum, using {MIN_BCRYPT_ROUNDS}")
+        return MIN_BCRYPT_ROUNDS
+    if rounds > MAX_BCRYPT_ROUNDS:
+        print(f"Ignoring out-of-range [login] bcrypt_rounds = {rounds}, using {DEFAULT_BCRYPT_ROUNDS}")
+        return DEFAULT_BCRYPT_ROUNDS
+    return rounds
+
+def get_hash_rounds(stored_password):
+    # bcrypt hashes look like $2b$12$<salt and hash>
+    try:
+        return int(stored_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def hash_password(password, rounds=None):
+    import bcrypt
+    salt = bcrypt.gensalt(rounds=rounds or get_bcrypt_rounds())
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+def rehash_password_if_needed(conn, student_id, password, stored_password):
+    try:
+        target_rounds = get_bcrypt_rounds()
+        if get_hash_rounds(stored_password) == target_rounds:
+            return
+        cursor = conn.cursor()
+        update_query = """
+            UPDATE student_login
+            SET password = %s
+            WHERE student_id = %s AND password = %s
+        """
+        cursor.execute(update_query, (hash_password(password, target_rounds), student_id, stored_password))
+        conn.commit()
+        invalidate_tables("student_login")
+        cursor.close()
+    except Exception as e:
+        # The old hash still works, so the login goes ahead anyway
+        print(f"Unable to rehash password for {student_id}: {e}")
+
+def calibrate_bcrypt_rounds(target_ms, min_rounds=MIN_BCRYPT_ROUNDS, max_rounds=16, samples=3):
+    # Returns the highest cost whose checkpw time stays within target_ms on
+    # this host, together with the measured time for every cost tried. Never
+    # goes below MIN_BCRYPT_ROUNDS, even if that cost misses target_ms.
+    import bcrypt
+    min_rounds = max(min_rounds, MIN_BCRYPT_ROUNDS)
+    max_rounds = min(max(max_rounds, min_rounds), MAX_BCRYPT_ROUNDS)
+    password = b"calibration-password"
+    timings = {}
+    chosen_rounds = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+        elapsed = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt.checkpw(password, hashed)
+            elapsed.append((time.perf_counter() - started) * 1000)
+        timings[rounds] = sorted(elapsed)[len(elapsed) // 2]
+        if timings[rounds] > target_ms:
+            break
+        chosen_rounds = rounds
+    return chosen_rounds, timings
+
+
+# ========================================
+# Login throttling
+# Every failed login drains a token bucket for its student ID and one for its
+# client address. Both are checked before MySQL or bcrypt, so bursts of bad
+# attempts (wrong passwords sprayed across many IDs, or enumeration of IDs that
+# do not exist) are rejected early. Unknown IDs are also remembered for a short
+# time. The client bucket is sized for a campus NAT, where many students share
+# one address; students who logged in successfully recently skip it, so an
+# attack from behind the same address cannot lock them out.
+LOGIN_BUCKETS = {
+    # kind: (capacity, tokens refilled per second)
+    "student": (5, 5 / 60),
+    "client": (60, 60 / 60),
+}
+UNKNOWN_ID_TTL_SECONDS = 60
+RECENT_LOGIN_TTL_SECONDS = 12 * 60 * 60
+THROTTLE_MAX_ENTRIES = 10000
+
+@st.cache_resource
+def get_login_throttle():
+    # Shared by every session of this server process
+    return {"lock": threading.Lock(), "buckets": {}, "unknown_ids": {}, "recent_logins": {}}
+
+def trust_forwarded_for():
+    # Only turn on ([login] trust_forwarded_for = true) when a proxy in front of
+    # the app sets X-Forwarded-For; otherwise clients can spoof it
+    try:
+        return bool(st.secrets["login"]["trust_forwarded_for"])
+    except (KeyError, FileNotFoundError):
+        return False
+
+def get_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+def get_client_id():
+    if trust_forwarded_for():
+        forwarded_for = st.context.headers.get("X-Forwarded-For")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    ip_address = getattr(st.context, "ip_address", None)
+    if ip_address:
+        return ip_address
+    # No address available (e.g. behind some proxies), fall back to the session
+    return get_session_id() or "unknown"
+
+def get_throttle_keys(student_id):
+    return ("student", student_id), ("client", get_client_id())
+
+def refill_bucket(kind, bucket, now):
+    capacity, refill_rate = LOGIN_BUCKETS[kind]
+    tokens, updated = bucket
+    return min(capacity, tokens + (now - updated) * refill_rate)
+
+def login_allowed(throttle_keys):
+    student_key, client_key = throttle_keys
+    throttle = get_login_throttle()
+    now = time.monotonic()
+    with throttle["lock"]:
+        student_bucket = throttle["buckets"].get(student_key)
+        if student_bucket and refill_bucket("student", student_bucket, now) < 1:
+            return False
+        expires_at = throttle["recent_logins"].get(student_key[1])
+        if expires_at is not None and expires_at >= now:
+            return True
+        client_bucket = throttle["buckets"].get(client_key)
+        return not (client_bucket and refill_bucket("client", client_bucket, now) < 1)
+
+def record_login_failure(throttle_keys):
+    throttle = get_login_throttle()
+    now = time.monotonic()
+    with throttle["lock"]:
+        buckets = throttle["buckets"]
+        for kind, key in throttle_keys:
+            bucket = buckets.get((kind, key))
+            tokens = refill_bucket(kind, bucket, now) if bucket else LOGIN_BUCKETS[kind][0]
+            buckets[(kind, key)] = (max(tokens - 1, 0), now)
+        if len(buckets) > THROTTLE_MAX_ENTRIES:
+            # Buckets that have refilled completely carry no state worth keeping
+            for bucket_key, bucket in list(buckets.items()):
+                if refill_bucket(bucket_key[0], bucket, now) >= LOGIN_BUCKETS[bucket_key[0]][0]:
+                    del buckets[bucket_key]
+
+def is_unknown_student_id(student_id):
+    throttle = get_login_throttle()
+    with throttle["lock"]:
+        expires_at = throttle["unknown_ids"].get(student_id)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del throttle["unknown_ids"][student_id]
+            return False
+        return True
+
+def remember_student_id(kind, student_id, ttl):
+    throttle = get_login_throttle()
+    now = time.monotonic()
+    with throttle["lock"]:
+        student_ids = throttle[kind]
+        if len(student_ids) >= THROTTLE_MAX_ENTRIES:
+            for expired_id in [key for key, expires_at in student_ids.items() if expires_at < now]:
+                del student_ids[expired_id]
+            if len(student_ids) >= THROTTLE_MAX_ENTRIES:
+                return
+        student_ids[student_id] = now + ttl
+
+def remember_unknown_student_id(student_id):
+    remember_student_id("unknown_ids", student_id, UNKNOWN_ID_TTL_SECONDS)
+
+def record_login_success(student_id):
+    remember_student_id("recent_logins", student_id, RECENT_LOGIN_TTL_SECONDS)
+
+
+# ========================================
+# Static assets
+# CSS is served from static/ by Streamlit's static file serving (see
+# .streamlit/config.toml). Every rerun still has to emit the <link> tag, since
+# Streamlit drops elements a rerun does not send, but that tag is a few bytes
+# and the content-hashed URL lets the browser keep the stylesheet cached.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+TITLE_HTML = '<div class="custom-title"><h1>Student Registration System</h1></div>'
+
+@st.cache_resource
+def load_static_asset(filename):
+    with open(os.path.join(STATIC_DIR, filename), "r", encoding="utf-8") as f:
+        content = f.read()
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+    return content, f"app/static/{filename}?v={content_hash}"
+
+def use_css(filename):
+    content, url = load_static_asset(filename)
+    if st.get_option("server.enableStaticServing"):
+        st.markdown(f'<link rel="stylesheet" href="{url}">', unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>{content}</style>", unsafe_allow_html=True)
+
+# ========================================
+# Function to get profile image URL
+PROFILE_IMAGE_TTL_SECONDS = 600
+PROFILE_IMAGE_TIMEOUT_SECONDS = 3
+
+@st.cache_data(ttl=PROFILE_IMAGE_TTL_SECONDS, show_spinner=False)
+def profile_image_exists(profile_image_url):
+    import requests
+    # Network errors propagate, which keeps them out of st.cache_data
+    response = requests.head(profile_image_url, timeout=PROFILE_IMAGE_TIMEOUT_SECONDS)
+    return response.status_code == 200
+
+def get_profile_image_url(student_id):
     base_url = "https://raw.githubusercontent.com/shiniji123/Streamlit_with_New/main/image/"
-    default_image_url = f"{base_url}default_profile.jpg"
+    default_image_url = f"{base_url}default_image.jpg"
     profile_image_url = f"{base_url}profile_{student_id}.jpg"
 
     # ตรวจสอบว่า URL ของรูปภาพมีอยู่หรือไม่
     try:
-        response = requests.head(profile_image_url)
-        if response.status_code == 200:
-            image_url = profile_image_url
-        else:
-            image_url = default_image_url
-    except:
-        image_url = default_image_url
+        if profile_image_exists(profile_image_url):
+            return profile_image_url
+    except Exception:
+        pass
+    return default_image_url
+
+def display_image_with_frame(image_url, width=125):
+    # The browser loads and caches the image itself instead of receiving it
+    # inline as base64 on every rerun
+    if image_url:
+        use_css("profile_image.css")
+        st.markdown(
+            f'<div class="profile-frame"><img src="{image_url}" style="width: {width}px;"></div>',
+            unsafe_allow_html=True
+        )
+    else:
+        st.error("Unable to load image.")
+
 
-    # ดาวน์โหลดรูปภาพและคืนค่าเป็นไบต์
+def get_student_name(student_id):
+    from mysql.connector import Error
     try:
-        image_response = requests.get(image_url)
-        if image_response.status_code == 200:
-            image_bytes = image_response.content
-            return image_bytes
+        query = """
+            SELECT first_name, last_name
+            FROM student
+            WHERE student_id = %s
+        """
+        student_data = cached_read_sql(query, (student_id,))
+        if student_data is not None and not student_data.empty:
+            return f"{student_data['first_name'].iloc[0]} {student_data['last_name'].iloc[0]}"
         else:
             return None
-    except:
+    except Error as e:
+        st.error(f"Error fetching student data: {e}")
         return None
+# ========================================
+# Post-login warm-up
+# Fills the shared query cache, course catalog and profile image cache for the
+# pages a student usually opens right after logging in, so their first visit
+# is a cache hit. Everything it loads lives in those shared caches, which
+# already handle invalidation, so the warm-up keeps no state of its own. At
+# most WARMUP_MAX_THREADS run at once; logins beyond that (the opening-rush
+# storm) skip the warm-up and simply load on first visit.
+WARMUP_MAX_THREADS = 4
+
+@st.cache_resource
+def get_warmup_slots():
+    # Shared by every session of this server process
+    return threading.BoundedSemaphore(WARMUP_MAX_THREADS)
+
+def start_warmup(student_id):
+    slots = get_warmup_slots()
+    if not slots.acquire(blocking=False):
+        return
+    thread = threading.Thread(target=run_warmup, args=(slots, student_id), name=f"warmup-{student_id}", daemon=True)
+    try:
+        thread.start()
+    except RuntimeError:
+        slots.release()
 
-def display_image_with_frame(image_bytes, width=125):
-    if image_bytes:
-        encoded_image = base64.b64encode(image_bytes).decode()
-
-        image_html = f'''
-        <div style="text-align: center;">
-            <img src="data:image/jpeg;base64,{encoded_image}" style="
-                width: {width}px;
-                border: 5px solid #1a458a;
-                /* border-radius: 50%; */  /* เอาบรรทัดนี้ออกหรือคอมเมนต์ไว้ */
-                box-shadow: 5px 5px 15px rgba(0,0,0,0.5);
-            ">
-        </div>
-        '''
-        st.markdown(image_html, unsafe_allow_html=True)
-    else:
-        st.error("Unable to load image.")
+def run_warmup(slots, student_id):
+    try:
+        # Reads the catalog, the enrollments and the student row; the course
+        # pages derive their lists from the first two
+        for loader in (get_registration_status_data, get_profile_image_url):
+            try:
+                loader(student_id)
+            except Exception as e:
+                print(f"Warm-up of {loader.__name__} failed for {student_id}: {e}")
+    finally:
+        slots.release()
 
+# ========================================
+# Enrollment audit log
+# Adds, drops and withdrawals are appended to a local write-ahead file (an
+# intent before the SQL runs, then its outcome) and a background thread
+# copies them to the enrollment_audit table in batches. The table is created
+# by sql/enrollment_audit.sql, so the app's MySQL user needs no DDL rights.
+# The checkpoint file holds the WAL offset already stored in MySQL, so events
+# written before a crash are replayed on the next start; event_id makes the
+# replay idempotent.
+# The files live in [audit] dir from secrets.toml (relative paths are taken
+# from the app directory), or in audit/ next to this file by default.
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIT_WAL_FILENAME = "enrollment_audit.wal"
+AUDIT_CHECKPOINT_FILENAME = "enrollment_audit.checkpoint"
+AUDIT_FSYNC_POLICIES = ("always", "interval", "never")
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL_SECONDS = 1.0
+AUDIT_MAX_PENDING_EVENTS = 10000      # appends wait when the flusher is this far behind
+AUDIT_BACKPRESSURE_TIMEOUT_SECONDS = 5.0
+AUDIT_WAL_ROTATE_BYTES = 16 * 1024 * 1024
+
+def get_audit_fsync_policy():
+    # always: fsync every append, interval: fsync once per flush cycle,
+    # never: leave it to the OS
+    try:
+        policy = st.secrets["audit"]["fsync"]
+    except (KeyError, FileNotFoundError):
+        return "interval"
+    return policy if policy in AUDIT_FSYNC_POLICIES else "interval"
 
-def get_student_name(student_id):
-    conn = create_connection()
-    if conn:
+def get_audit_dir():
+    try:
+        audit_dir = st.secrets["audit"]["dir"]
+    except (KeyError, FileNotFoundError):
+        audit_dir = "audit"
+    return os.path.join(APP_DIR, os.path.expanduser(audit_dir))
+
+@st.cache_resource
+def get_audit_log():
+    # One WAL and one flusher thread per server process
+    audit_dir = get_audit_dir()
+    os.makedirs(audit_dir, exist_ok=True)
+    wal_path = os.path.join(audit_dir, AUDIT_WAL_FILENAME)
+    checkpoint_path = os.path.join(audit_dir, AUDIT_CHECKPOINT_FILENAME)
+    checkpoint = read_audit_checkpoint(checkpoint_path)
+    wal_size = recover_audit_wal(wal_path)
+    audit_log = {
+        "condition": threading.Condition(),
+        "wal_path": wal_path,
+        "checkpoint_path": checkpoint_path,
+        "file": open(wal_path, "ab"),
+        "fsync": get_audit_fsync_policy(),
+        "checkpoint": min(checkpoint, wal_size),
+        "pending": count_audit_events(wal_path, min(checkpoint, wal_size)),
+        "stats": {"appended": 0, "flushed": 0, "flush_errors": 0, "backpressure_waits": 0},
+    }
+    thread = threading.Thread(target=run_audit_flusher, args=(audit_log,), name="audit-flusher", daemon=True)
+    thread.start()
+    return audit_log
+
+def start_audit_log():
+    # A read-only or misconfigured audit directory must not take the app down;
+    # audit_enrollment already skips events while the log is unavailable
+    try:
+        get_audit_log()
+    except Exception as e:
+        print(f"Audit log unavailable, enrollments are not being audited: {e}")
+
+def read_audit_checkpoint(checkpoint_path):
+    try:
+        with open(checkpoint_path, "r") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def write_audit_checkpoint(checkpoint_path, offset):
+    temp_path = checkpoint_path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+def recover_audit_wal(wal_path):
+    # A crash in the middle of an append leaves a line without its newline;
+    # cut it off so later appends start on a clean line
+    if not os.path.exists(wal_path):
+        return 0
+    with open(wal_path, "r+b") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            print(f"Audit WAL: dropping {len(data) - end} bytes of a torn write")
+            f.truncate(end)
+    return end
+
+def count_audit_events(wal_path, offset):
+    with open(wal_path, "rb") as f:
+        f.seek(offset)
+        return sum(1 for _ in f)
+
+def audit_enrollment(action, student_id, course_ids, outcome, batch_id=None, semester=None, year=None):
+    # Mutators log an "intent" batch before executing their SQL and then a
+    # "committed" or "failed" batch with the same batch_id, so a crash right
+    # after the commit still leaves the intent on record. Audit failures
+    # (disk full, permissions) are logged but never break the enrollment.
+    import uuid
+    batch_id = batch_id or uuid.uuid4().hex
+    try:
+        record_enrollment_event(action, student_id, course_ids, outcome, batch_id, semester, year)
+    except Exception as e:
+        print(f"Unable to write {outcome} audit event {batch_id} for {student_id}: {e}")
+    return batch_id
+
+def record_enrollment_event(action, student_id, course_ids, outcome, batch_id, semester=None, year=None):
+    import json
+    import uuid
+    audit_log = get_audit_log()
+    occurred_at = datetime.now().isoformat(timespec="microseconds")
+    lines = b"".join(
+        json.dumps({
+            "event_id": uuid.uuid4().hex,
+            "batch_id": batch_id,
+            "action": action,
+            "outcome": outcome,
+            "student_id": str(student_id),
+            "course_id": str(course_id),
+            "semester": semester,
+            "year": year,
+            "occurred_at": occurred_at,
+        }).encode("utf-8") + b"\n"
+        for course_id in course_ids
+    )
+    condition = audit_log["condition"]
+    with condition:
+        if audit_log["pending"] >= AUDIT_MAX_PENDING_EVENTS:
+            audit_log["stats"]["backpressure_waits"] += 1
+            condition.notify_all()
+            # The event is never dropped: after the timeout it is still
+            # written to the WAL, which is durable on its own
+            condition.wait_for(
+                lambda: audit_log["pending"] < AUDIT_MAX_PENDING_EVENTS, timeout=AUDIT_BACKPRESSURE_TIMEOUT_SECONDS
+            )
+        audit_log["file"].write(lines)
+        audit_log["file"].flush()
+        if audit_log["fsync"] == "always":
+            os.fsync(audit_log["file"].fileno())
+        audit_log["pending"] += len(course_ids)
+        audit_log["stats"]["appended"] += len(course_ids)
+        if audit_log["pending"] >= AUDIT_BATCH_SIZE:
+            condition.notify_all()
+
+def run_audit_flusher(audit_log):
+    condition = audit_log["condition"]
+    while True:
+        with condition:
+            condition.wait_for(lambda: audit_log["pending"] >= AUDIT_BATCH_SIZE, timeout=AUDIT_FLUSH_INTERVAL_SECONDS)
+            if audit_log["pending"] == 0:
+                continue
+            if audit_log["fsync"] == "interval":
+                os.fsync(audit_log["file"].fileno())
+            offset = audit_log["checkpoint"]
         try:
-            query = """
-                SELECT first_name, last_name
-                FROM student
-                WHERE student_id = %s
-            """
-            student_data = pd.read_sql(query, conn, params=(student_id,))
-            if not student_data.empty:
-                return f"{student_data['first_name'].iloc[0]} {student_data['last_name'].iloc[0]}"
-            else:
-                return None
-        except Error as e:
-            st.error(f"Error fetching student data: {e}")
-            return None
+            while flush_audit_batch(audit_log, offset):
+                offset = audit_log["checkpoint"]
+        except Exception as e:
+            audit_log["stats"]["flush_errors"] += 1
+            print(f"Audit flush failed, will retry: {e}")
+            time.sleep(AUDIT_FLUSH_INTERVAL_SECONDS)
+
+def flush_audit_batch(audit_log, offset):
+    import json
+    events = []
+    end = offset
+    # Unreadable lines were counted in pending too, so count every line consumed
+    consumed = 0
+    with open(audit_log["wal_path"], "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n") or consumed >= AUDIT_BATCH_SIZE:
+                break
+            end += len(line)
+            consumed += 1
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                print(f"Audit WAL: skipping unreadable event {line!r}")
+    if not consumed:
+        return False
+
+    if events:
+        conn = create_connection()
+        if not conn:
+            raise ConnectionError("Unable to connect to the database.")
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT IGNORE INTO enrollment_audit
+                    (event_id, batch_id, action, outcome, student_id, course_id, semester, year, occurred_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                # Events written before batch_id/outcome existed were logged after their commit
+                (event["event_id"], event.get("batch_id"), event["action"], event.get("outcome", "committed"),
+                 event["student_id"], event["course_id"], event["semester"], event["year"], event["occurred_at"])
+                for event in events
+            ])
+            conn.commit()
+            cursor.close()
         finally:
             close_connection(conn)
-    else:
-        return None
+
+    write_audit_checkpoint(audit_log["checkpoint_path"], end)
+    condition = audit_log["condition"]
+    with condition:
+        audit_log["checkpoint"] = end
+        audit_log["pending"] = max(audit_log["pending"] - consumed, 0)
+        audit_log["stats"]["flushed"] += len(events)
+        if audit_log["pending"] == 0 and end >= AUDIT_WAL_ROTATE_BYTES:
+            # Everything is in MySQL, so start the WAL over
+            audit_log["file"].truncate(0)
+            write_audit_checkpoint(audit_log["checkpoint_path"], 0)
+            audit_log["checkpoint"] = 0
+        condition.notify_all()
+    return audit_log["pending"] > 0
+
+
 # ========================================
 # Main program
 def main():
+    # Starts the audit flusher, which replays events left in the WAL by a crash
+    start_audit_log()
+
     if "logged_in" not in st.session_state:
         st.session_state['logged_in'] = False
 
@@ -786,6 +1404,8 @@ def main():
         st.rerun()
 
     if st.session_state['logged_in']:
+        # Only the logged-in layout draws the sidebar menu, so the login page never imports it
+        from streamlit_option_menu import option_menu
         student_id = st.session_state.get("username", None)
         student_name = get_student_name(student_id)
         # Define menu options and icons
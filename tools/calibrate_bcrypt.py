@@ -0,0 +1,45 @@
+"""Pick the bcrypt cost factor that fits this host's login latency budget.
+
+Measures bcrypt.checkpw at increasing cost factors and suggests the highest
+one whose median check time stays within --target-ms, but never less than
+the app's minimum cost. Put the result in .streamlit/secrets.toml; try_login
+rehashes existing passwords to that cost as students log in.
+
+    python tools/calibrate_bcrypt.py --target-ms 250
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from student_login_15 import MIN_BCRYPT_ROUNDS, calibrate_bcrypt_rounds, get_bcrypt_rounds  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=250, help="login budget for one checkpw call")
+    parser.add_argument("--min-rounds", type=int, default=MIN_BCRYPT_ROUNDS,
+                        help=f"lowest cost to try (raised to {MIN_BCRYPT_ROUNDS} if lower)")
+    parser.add_argument("--max-rounds", type=int, default=16)
+    parser.add_argument("--samples", type=int, default=3, help="checkpw calls timed per cost factor")
+    args = parser.parse_args()
+
+    rounds, timings = calibrate_bcrypt_rounds(args.target_ms, args.min_rounds, args.max_rounds, args.samples)
+    for cost, elapsed_ms in timings.items():
+        marker = "  <- chosen" if cost == rounds else ""
+        print(f"  cost {cost:2d}: {elapsed_ms:9.1f} ms{marker}")
+    print()
+    if timings[rounds] > args.target_ms:
+        print(f"Warning: even the minimum cost {rounds} takes {timings[rounds]:.1f} ms, over the "
+              f"{args.target_ms:g} ms target. Logins on this host will be slower than the target.")
+        print()
+    print(f"Current target cost: {get_bcrypt_rounds()}")
+    print("Add to .streamlit/secrets.toml:")
+    print()
+    print("[login]")
+    print(f"bcrypt_rounds = {rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Memory benchmark for the shared course catalog.
+
+Builds a synthetic catalog and simulates many concurrent sessions that each
+hold the Add Course list, once the old way (a fresh object-dtype DataFrame per
+session with the option column course_selection_page used to add) and once as
+CourseViews over the shared catalog. Reports the traced allocations per
+session for both, counting Arrow-backed string buffers as well.
+
+    python tools/catalog_memory_bench.py
+    python tools/catalog_memory_bench.py --sessions 1000 --courses 600
+"""
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from student_login_15 import build_course_catalog, catalog_rows, course_view  # noqa: E402
+
+SUBJECTS = ["Calculus", "Statistics", "Physics", "Chemistry", "Biology", "Economics", "Programming", "Databases"]
+FIRST_NAMES = ["Somchai", "Suda", "Anan", "Kanya", "Prasert", "Malee", "Niran", "Ratana"]
+LAST_NAMES = ["Srisuk", "Wongsa", "Chaiyaporn", "Thongdee", "Boonmee", "Saetang"]
+
+
+def make_catalog_df(course_count, seed):
+    rng = random.Random(seed)
+    rows = []
+    for number in range(course_count):
+        rows.append({
+            "course_id": str(100000 + number),
+            "course_name": f"{rng.choice(SUBJECTS)} {rng.randint(1, 4)}",
+            "credits": rng.choice([1, 2, 3]),
+            "instructor_first_name": rng.choice(FIRST_NAMES),
+            "instructor_last_name": rng.choice(LAST_NAMES),
+            "is_old": int(rng.random() < 0.1),
+        })
+    return pd.DataFrame(rows)
+
+
+def fresh_copy(value):
+    # The MySQL driver creates new string objects for every result set
+    return "".join(list(value)) if isinstance(value, str) else value
+
+
+def legacy_session(catalog_df, enrolled_ids):
+    # What get_unenrolled_courses + course_selection_page used to hold
+    rows = catalog_df[(catalog_df["is_old"] == 0) & ~catalog_df["course_id"].isin(enrolled_ids)]
+    df = pd.DataFrame({
+        column: [fresh_copy(value) for value in rows[column]]
+        for column in ["course_id", "course_name", "credits", "instructor_first_name", "instructor_last_name"]
+    })
+    df["option"] = df.apply(
+        lambda row: f"{row['course_id']}: {row['course_name']} ({row['credits']} credits) - Instructor: {row['instructor_first_name']} {row['instructor_last_name']}",
+        axis=1
+    )
+    return df
+
+
+def view_session(catalog, enrolled_ids):
+    return course_view(catalog, catalog["current"] & ~catalog_rows(catalog, enrolled_ids))
+
+
+def arrow_allocated_bytes():
+    # pandas string columns may live in Arrow buffers, which tracemalloc cannot see
+    try:
+        import pyarrow
+    except ImportError:
+        return 0
+    return pyarrow.total_allocated_bytes()
+
+
+def measure(build_sessions):
+    arrow_before = arrow_allocated_bytes()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = build_sessions()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return sessions, total + arrow_allocated_bytes() - arrow_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=400)
+    parser.add_argument("--enrolled", type=int, default=6, help="courses each student is enrolled in")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    catalog_df = make_catalog_df(args.courses, args.seed)
+    rng = random.Random(args.seed)
+    enrollments = [rng.sample(list(catalog_df["course_id"]), args.enrolled) for _ in range(args.sessions)]
+
+    catalog, catalog_bytes = measure(lambda: build_course_catalog(catalog_df))
+    legacy, legacy_bytes = measure(lambda: [legacy_session(catalog_df, ids) for ids in enrollments])
+    views, view_bytes = measure(lambda: [view_session(catalog, ids) for ids in enrollments])
+
+    print(f"{args.sessions} sessions, {args.courses} courses, {args.enrolled} enrolled each")
+    print()
+    print(f"{'':28}{'total':>12}{'per session':>14}")
+    print(f"{'DataFrame per session':28}{legacy_bytes / 1024:10.0f} KB{legacy_bytes / args.sessions:11.0f} B")
+    print(f"{'CourseView per session':28}{view_bytes / 1024:10.0f} KB{view_bytes / args.sessions:11.0f} B")
+    print(f"{'shared catalog (once)':28}{catalog_bytes / 1024:10.0f} KB")
+    print()
+    print(f"Reduction: {legacy_bytes / max(view_bytes + catalog_bytes, 1):.0f}x including the shared catalog")
+
+
+if __name__ == "__main__":
+    main()
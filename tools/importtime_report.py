@@ -0,0 +1,80 @@
+"""Startup benchmark for student_login_15.py based on ``python -X importtime``.
+
+Runs a fresh interpreter that only imports the app module (what every new
+Streamlit server process does before the first render) and reports the total
+import time, the slowest modules and whether any of the heavy modules that
+should load on first use were pulled in at startup.
+
+    python tools/importtime_report.py
+    python tools/importtime_report.py --top 30 --budget-ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULE = "student_login_15"
+DEFERRED_MODULES = ["pandas", "mysql.connector", "requests", "bcrypt", "streamlit_option_menu"]
+
+
+def run_importtime(statement):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Import failed:\n{result.stderr}")
+    return parse_importtime(result.stderr)
+
+
+def parse_importtime(output):
+    # Lines look like "import time:       self |  cumulative | package"
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, default=None, help="exit with status 1 above this total")
+    args = parser.parse_args()
+
+    # streamlit itself is always needed, so report it separately from the app
+    streamlit_rows = run_importtime("import streamlit")
+    app_rows = run_importtime(f"import {APP_MODULE}")
+
+    streamlit_ms = sum(row[2] for row in streamlit_rows if row[3] == 0) / 1000
+    total_ms = sum(row[2] for row in app_rows if row[3] == 0) / 1000
+    loaded = {row[0] for row in app_rows}
+
+    print(f"{'streamlit alone':24}{streamlit_ms:8.1f} ms")
+    print(f"{APP_MODULE + ' total':24}{total_ms:8.1f} ms")
+    print(f"{'app overhead':24}{total_ms - streamlit_ms:8.1f} ms")
+    print()
+    print(f"Slowest {args.top} modules by cumulative time:")
+    for name, self_us, cumulative_us, depth in sorted(app_rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    print()
+    print("Deferred modules loaded at startup:")
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    for name in DEFERRED_MODULES:
+        print(f"  {name:24} {'loaded' if name in eager else 'deferred'}")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        sys.exit(f"Startup import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()